@@ -6,36 +6,162 @@ Generates an interactive map from feria data JSON file.
 Creates color-coded markers for each feria based on the day of the week.
 """
 
+import atexit
+import functools
 import json
 import sys
 import subprocess
 import os
-from typing import List, Dict, Tuple, Optional
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Tuple, Optional
 import click
 import folium
+import jinja2
+import numpy as np
+from geopy.adapters import RequestsAdapter
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+from geopy.location import Location
+from geopy.exc import GeopyError
+from geopy.extra.rate_limiter import RateLimiter
 from tqdm import tqdm
+from urllib3.util.retry import Retry
 import time
 import re
+from collections import Counter, defaultdict
+
+try:
+    import orjson
+except ImportError:  # Optional; faster JSON parsing
+    orjson = None
+
+try:
+    from playwright.sync_api import sync_playwright
+except ImportError:  # Optional; snapshots fall back to Node.js + Puppeteer
+    sync_playwright = None
+
+
+# Default on-disk location of the geocoding cache
+GEOCODE_CACHE_FILE = 'ferias_geocache.json'
+
+# Failed lookups are retried once they are older than this (seconds)
+NEGATIVE_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Montevideo bounding box as (south-west, north-east) (lat, lon) corners
+MONTEVIDEO_VIEWBOX = [(-34.95, -56.25), (-34.85, -56.05)]
+
+
+def _in_montevideo(coords: np.ndarray) -> np.ndarray:
+    """Boolean mask of the (lat, lon) rows of an (N, 2) array inside MONTEVIDEO_VIEWBOX."""
+    (south, west), (north, east) = MONTEVIDEO_VIEWBOX
+    lats, lons = coords[:, 0], coords[:, 1]
+    return (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+
+
+# Puppeteer screenshot script shipped alongside this module
+SNAPSHOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshot.js')
+
+# Default number of worker threads used for geocoding
+GEOCODE_WORKERS = 4
+
+# Prefixes, house-number suffixes and street connectors stripped by clean_address
+_CLEAN_RE = re.compile(
+    r'^(?:la calle\s+(?:el\s+)?|el\s+)|\s+el\s+Nº\s+\d+.*$|\s+(?P<connector>desde|hasta|entre|y)(?=\s)',
+    re.IGNORECASE
+)
+_WS_RE = re.compile(r'\s+')
+
+# Marker popup, compiled once and rendered per feria
+_POPUP_TEMPLATE = jinja2.Template("""
+            <div style="font-family: Arial, sans-serif; min-width: 250px; max-width: 300px;">
+                <h4 style="margin: 0 0 10px 0; color: #333; border-bottom: 2px solid {{ color }}; padding-bottom: 5px;">
+                    {{ barrio }}
+                </h4>
+                <p style="margin: 8px 0;"><strong>Ubicación:</strong> {{ location_desc }}</p>
+                <p style="margin: 8px 0;"><strong>Día:</strong> <span style="color: {{ color }}; font-weight: bold;">{{ day }}</span></p>
+            </div>
+            """)
+
+
+# Marker color for each day of the week, Monday first
+_DAY_COLORS = (
+    ('Lunes', 'blue'),
+    ('Martes', 'green'),
+    ('Miércoles', 'purple'),
+    ('Jueves', 'orange'),
+    ('Viernes', 'darkred'),
+    ('Sábado', 'red'),
+    ('Domingo', 'cadetblue')
+)
+
+# Map legend, identical for every map
+_LEGEND_HTML = ''.join([
+    '''
+        <div style="position: fixed; 
+                    bottom: 20px; left: 20px; 
+                    background-color: white; 
+                    border: 2px solid #666; 
+                    border-radius: 8px;
+                    z-index: 9999; 
+                    font-family: Arial, sans-serif;
+                    font-size: 12px; 
+                    padding: 15px;
+                    box-shadow: 0 2px 10px rgba(0,0,0,0.3);
+                    max-height: 300px;
+                    overflow-y: auto;">
+        <h4 style="margin: 0 0 15px 0; color: #333; text-align: center; border-bottom: 1px solid #ccc; padding-bottom: 8px;">
+            Días de la Semana
+        </h4>
+        ''',
+    *(f'''
+            <div style="margin: 5px 0; display: flex; align-items: center;">
+                <i class="fa fa-circle" style="color: {color}; margin-right: 8px; font-size: 14px;"></i>
+                <span style="color: #333;">{day}</span>
+            </div>
+            ''' for day, color in _DAY_COLORS),
+    '</div>'
+])
 
 
 class FeriasMapGenerator:
     """Generator for interactive maps of feria vecinal locations."""
     
-    def __init__(self):
-        self.geolocator = Nominatim(user_agent="ferias-cli/1.0")
-        self.day_colors = {
-            'Lunes': 'blue',
-            'Martes': 'green', 
-            'Miércoles': 'purple',
-            'Jueves': 'orange',
-            'Viernes': 'darkred',
-            'Sábado': 'red',
-            'Domingo': 'cadetblue'
-        }
-        # Montevideo center coordinates as fallback
-        self.montevideo_center = (-34.9011, -56.1645)
+    # Weekday numbers (Monday=0) and marker colors indexed by them;
+    # the extra last color is used for unrecognized days
+    _DAY_TO_INT = {day: i for i, (day, _) in enumerate(_DAY_COLORS)}
+    _COLORS_BY_INT = tuple(color for _, color in _DAY_COLORS) + ('gray',)
+    _UNKNOWN_DAY = len(_DAY_COLORS)
+    
+    def __init__(self, cache_file: Optional[str] = GEOCODE_CACHE_FILE):
+        # One pooled keep-alive session serves every request; urllib3 handles backoff
+        self.geolocator = Nominatim(
+            user_agent="ferias-cli/1.0",
+            adapter_factory=functools.partial(
+                RequestsAdapter,
+                pool_connections=8,
+                pool_maxsize=8,
+                max_retries=Retry(total=3, backoff_factor=2, status_forcelist=[429, 502, 503, 504])
+            )
+        )
+        # Shared by all worker threads so Nominatim's 1 req/s policy holds globally
+        self._geocode = RateLimiter(
+            self.geolocator.geocode,
+            min_delay_seconds=1,
+            max_retries=0,
+            swallow_exceptions=False
+        )
+        self.cache_file = cache_file
+        # Normalized query -> {'coordinates': [lat, lon] or None, 'street_level': bool, 'timestamp': float}
+        self._cache: Dict[str, Dict] = {}
+        # Feria key -> index of the strategy that last geocoded it to a street
+        self._strategy_cache: Dict[str, int] = {}
+        # (barrio, is_intersection) -> how often each strategy index produced a
+        # street-level hit this run; the two kinds of feria use different strategy lists
+        self._barrio_strategy_stats: Dict[Tuple[str, bool], Counter] = defaultdict(Counter)
+        self._cache_dirty = False
+        self.load_cache()
+        atexit.register(self.save_cache)
     
     def clean_address(self, address: str) -> str:
         """
@@ -47,72 +173,114 @@ class FeriasMapGenerator:
         Returns:
             Cleaned address string
         """
-        # Remove common prefixes and suffixes
-        address = re.sub(r'^la calle\s+', '', address, flags=re.IGNORECASE)
-        address = re.sub(r'^el\s+', '', address, flags=re.IGNORECASE)
-        address = re.sub(r'\s+el\s+Nº\s+\d+.*$', '', address, flags=re.IGNORECASE)
-        address = re.sub(r'\s+desde\s+', ' ', address, flags=re.IGNORECASE)
-        address = re.sub(r'\s+hasta\s+', ' ', address, flags=re.IGNORECASE)
-        address = re.sub(r'\s+entre\s+', ' ', address, flags=re.IGNORECASE)
-        address = re.sub(r'\s+y\s+', ' ', address, flags=re.IGNORECASE)
+        # Remove common prefixes and suffixes, replace connectors with a space
+        address = _CLEAN_RE.sub(lambda m: ' ' if m.group('connector') else '', address)
         
         # Clean up extra spaces
-        address = re.sub(r'\s+', ' ', address).strip()
+        address = _WS_RE.sub(' ', address).strip()
         
         return address
     
-    def geocode_address(self, address: str, max_retries: int = 3) -> Optional[Tuple[float, float]]:
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Normalize a geocoding query so equivalent addresses share a cache entry."""
+        return ' '.join(query.lower().split())
+    
+    @staticmethod
+    def _feria_key(feria: Dict) -> str:
+        """Build the cache key identifying a feria location."""
+        return '|'.join(feria[field] for field in ('street', 'from', 'to', 'barrio'))
+    
+    def load_cache(self) -> None:
+        """Load previously geocoded queries from the cache file, if any."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            click.echo(f"Ignoring unreadable geocoding cache {self.cache_file}: {e}", err=True)
+            return
+        
+        now = time.time()
+        for query, entry in data.get('queries', {}).items():
+            # Drop stale misses so they get another chance
+            if entry['coordinates'] is None and now - entry['timestamp'] > NEGATIVE_CACHE_TTL:
+                self._cache_dirty = True
+                continue
+            self._cache[query] = entry
+        self._strategy_cache.update(data.get('strategies', {}))
+    
+    def save_cache(self) -> None:
+        """Persist the geocoding cache to disk if it changed."""
+        if not self.cache_file or not self._cache_dirty:
+            return
+        
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'queries': self._cache, 'strategies': self._strategy_cache},
+                          f, ensure_ascii=False, indent=2)
+            self._cache_dirty = False
+        except OSError as e:
+            click.echo(f"Error saving geocoding cache to {self.cache_file}: {e}", err=True)
+    
+    def geocode_address(self, address: str) -> Optional[Tuple[float, float]]:
         """
         Geocode an address using Nominatim API.
         
         Args:
             address: Address to geocode
-            max_retries: Maximum number of retry attempts
             
         Returns:
             Tuple of (latitude, longitude) or None if geocoding fails
         """
-        for attempt in range(max_retries):
-            try:
-                # Add Montevideo context to improve geocoding accuracy
-                full_address = f"{address}, Montevideo, Uruguay"
-                location = self.geolocator.geocode(full_address, timeout=10)
-                
-                if location:
-                    # Verify the location is actually in Montevideo (rough check)
-                    lat, lon = location.latitude, location.longitude
-                    if -34.95 <= lat <= -34.85 and -56.25 <= lon <= -56.05:
-                        return (lat, lon)
-                
-                # If first attempt fails, try without Montevideo context
-                location = self.geolocator.geocode(address, timeout=10)
-                if location:
-                    lat, lon = location.latitude, location.longitude
-                    # Verify the location is actually in Montevideo (rough check)
-                    if -34.95 <= lat <= -34.85 and -56.25 <= lon <= -56.05:
-                        return (lat, lon)
-                
-            except (GeocoderTimedOut, GeocoderUnavailable) as e:
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                    continue
-                else:
-                    return None
-            except Exception as e:
-                return None
+        cache_key = self._normalize_query(address)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            coordinates = cached['coordinates']
+            return tuple(coordinates) if coordinates else None
+        
+        try:
+            # Queries already carry the Montevideo context; let Nominatim restrict results to the city
+            location = self._geocode(address, timeout=10, viewbox=MONTEVIDEO_VIEWBOX, bounded=True)
+            
+            # Remember misses too so they are not asked again
+            return self._store(cache_key, location)
         
-        return None
+        except GeopyError:
+            # Retries exhausted; don't cache so the next run tries again
+            return None
     
-    def geocode_feria_location(self, feria: Dict, verbose: bool = False) -> Optional[Tuple[float, float]]:
+    def _store(self, cache_key: str, location: Optional[Location]) -> Optional[Tuple[float, float]]:
+        """Record a geocoding result (hit or miss) in the cache and return its coordinates."""
+        coordinates = (location.latitude, location.longitude) if location else None
+        self._cache[cache_key] = {
+            'coordinates': list(coordinates) if coordinates else None,
+            # Roads are as specific as a feria location gets
+            'street_level': bool(location) and location.raw.get('class') == 'highway',
+            'timestamp': time.time()
+        }
+        self._cache_dirty = True
+        return coordinates
+    
+    def _is_street_level(self, query: str) -> bool:
+        """Whether the cached result for a query resolved to a street."""
+        entry = self._cache.get(self._normalize_query(query))
+        return bool(entry and entry.get('street_level'))
+    
+    def _build_strategies(self, feria: Dict) -> List[str]:
         """
-        Geocode a feria location using multiple strategies.
+        Build the geocoding queries to try for a feria, most specific first.
+        
+        Also annotates the feria (see _annotate) so rendering reuses the
+        same classification.
         
         Args:
             feria: Feria dictionary
-            verbose: Whether to show verbose output
             
         Returns:
-            Tuple of (latitude, longitude) or None if geocoding fails
+            List of query strings
         """
         street = self.clean_address(feria['street'])
         from_street = self.clean_address(feria['from'])
@@ -121,10 +289,11 @@ class FeriasMapGenerator:
         
         # Determine if this is an intersection (from == to) or a street range
         is_intersection = from_street == to_street
+        self._annotate(feria, is_intersection)
         
         if is_intersection:
             # This is an intersection between two streets
-            strategies = [
+            return [
                 # Strategy 1: Intersection with barrio
                 f"{street} y {from_street}, {barrio}, Montevideo, Uruguay",
                 # Strategy 2: Intersection without barrio
@@ -136,84 +305,233 @@ class FeriasMapGenerator:
                 # Strategy 5: Barrio center
                 f"{barrio}, Montevideo, Uruguay"
             ]
+        
+        # This is a street range (from != to)
+        return [
+            # Strategy 1: Street with barrio
+            f"{street}, {barrio}, Montevideo, Uruguay",
+            # Strategy 2: Street intersection with from street
+            f"{street} y {from_street}, Montevideo, Uruguay",
+            # Strategy 3: Street intersection with to street
+            f"{street} y {to_street}, Montevideo, Uruguay",
+            # Strategy 4: Just street name with Montevideo
+            f"{street}, Montevideo, Uruguay",
+            # Strategy 5: Barrio center
+            f"{barrio}, Montevideo, Uruguay"
+        ]
+    
+    def _annotate(self, feria: Dict, is_intersection: Optional[bool] = None) -> None:
+        """
+        Store the derived fields used for rendering on a feria.
+        
+        Sets '_is_intersection', '_location_desc' and '_day_int'.
+        
+        Args:
+            feria: Feria dictionary
+            is_intersection: Precomputed intersection flag, if already known
+        """
+        if is_intersection is None:
+            is_intersection = self.clean_address(feria['from']) == self.clean_address(feria['to'])
+        feria['_is_intersection'] = is_intersection
+        if is_intersection:
+            feria['_location_desc'] = f"{feria['street']} y {feria['from']}"
         else:
-            # This is a street range (from != to)
-            strategies = [
-                # Strategy 1: Street with barrio
-                f"{street}, {barrio}, Montevideo, Uruguay",
-                # Strategy 2: Street intersection with from street
-                f"{street} y {from_street}, Montevideo, Uruguay",
-                # Strategy 3: Street intersection with to street
-                f"{street} y {to_street}, Montevideo, Uruguay",
-                # Strategy 4: Just street name with Montevideo
-                f"{street}, Montevideo, Uruguay",
-                # Strategy 5: Barrio center
-                f"{barrio}, Montevideo, Uruguay"
-            ]
+            feria['_location_desc'] = f"{feria['street']} entre {feria['from']} y {feria['to']}"
+        feria['_day_int'] = self._DAY_TO_INT.get(feria['day'], self._UNKNOWN_DAY)
+    
+    @staticmethod
+    def _stats_key(feria: Dict) -> Tuple[str, bool]:
+        """Key of the strategy stats a feria shares with ferias that have the same strategy list."""
+        return feria['barrio'], feria['_is_intersection']
+    
+    def _strategy_order(self, feria: Dict, count: int) -> List[int]:
+        """
+        Strategy indices to try for a feria.
         
-        for i, strategy in enumerate(strategies):
-            if verbose:
-                click.echo(f"  Strategy {i+1}: {strategy}")
+        The strategy that worked for this feria last time goes first,
+        followed by the ones that most often found streets for the same
+        kind of feria (intersection or street range) in its barrio.
+        """
+        stats = self._barrio_strategy_stats.get(self._stats_key(feria), Counter())
+        order = sorted(range(count), key=lambda i: -stats[i])
+        best = self._strategy_cache.get(self._feria_key(feria))
+        if best is not None and best < count:
+            order.remove(best)
+            order.insert(0, best)
+        return order
+    
+    def _remember_strategy(self, feria: Dict, index: int, query: str) -> None:
+        """Record which strategy geocoded a feria so later lookups try it first."""
+        feria_key = self._feria_key(feria)
+        # Coarse fallbacks (e.g. barrio center) always hit, so only keep and promote
+        # street hits; otherwise later runs would never retry the specific queries
+        # once their cached misses expire
+        if not self._is_street_level(query):
+            if self._strategy_cache.pop(feria_key, None) is not None:
+                self._cache_dirty = True
+            return
+        
+        if self._strategy_cache.get(feria_key) != index:
+            self._strategy_cache[feria_key] = index
+            self._cache_dirty = True
+        self._barrio_strategy_stats[self._stats_key(feria)][index] += 1
+    
+    def geocode_feria_location(self, feria: Dict, verbose: bool = False) -> Optional[Tuple[float, float]]:
+        """
+        Geocode a single feria location; see geocode_all.
+        
+        Args:
+            feria: Feria dictionary
+            verbose: Whether to show verbose output
             
-            location = self.geocode_address(strategy)
-            if location:
-                if verbose:
-                    click.echo(f"  ✓ Found: {location[0]}, {location[1]}")
-                return location
+        Returns:
+            Tuple of (latitude, longitude) or None if geocoding fails
+        """
+        # Quietly, on this thread: a single feria has one query per step
+        self._geocode_batch([feria], map, verbose)
+        return feria['coordinates']
+    
+    def geocode_all(self, ferias: List[Dict], verbose: bool = False, workers: int = GEOCODE_WORKERS) -> List[Dict]:
+        """
+        Geocode every feria, storing results under 'coordinates'.
+        
+        All ferias walk their strategy lists in lockstep; at each step every
+        pending feria picks its next strategy (see _strategy_order), and the
+        distinct queries picked are geocoded once, concurrently, and shared
+        by every feria that asked for them.
+        
+        Args:
+            ferias: List of feria dictionaries
+            verbose: Whether to show verbose output
+            workers: Number of threads geocoding concurrently
             
-            time.sleep(0.5)  # Be respectful
+        Returns:
+            The ferias that were geocoded successfully, in input order
+        """
+        click.echo("Geocoding feria locations...")
         
-        if verbose:
-            click.echo(f"  ✗ All strategies failed for {street}")
-        return None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            self._geocode_batch(ferias, executor.map, verbose, show_progress=True)
+        
+        geocoded_ferias = []
+        for feria in ferias:
+            if feria['coordinates']:
+                geocoded_ferias.append(feria)
+            elif verbose:
+                click.echo(f"Failed to geocode: {feria['street']} in {feria['barrio']}")
+        
+        return geocoded_ferias
     
-    def generate_map(self, ferias: List[Dict], output_file: str = 'ferias_map.html', verbose: bool = False) -> bool:
+    def _geocode_batch(self, ferias: List[Dict], map_queries: Callable, verbose: bool = False,
+                       show_progress: bool = False) -> None:
+        """
+        Run the lockstep strategy walk of geocode_all over ferias.
+        
+        Args:
+            ferias: List of feria dictionaries, updated with 'coordinates'
+            map_queries: map-like callable used to geocode each step's queries
+            verbose: Whether to show verbose output
+            show_progress: Whether to draw a progress bar
+        """
+        strategies = []
+        for feria in ferias:
+            strategies.append(self._build_strategies(feria))
+            feria['coordinates'] = None
+        tried = [set() for _ in ferias]
+        
+        pending = list(range(len(ferias)))
+        step = 0
+        with tqdm(total=len(ferias), desc="Processing ferias", disable=not show_progress) as progress:
+            while pending:
+                # Next untried strategy per feria, reordered by what has worked so far
+                picks = {}
+                for n in pending:
+                    order = self._strategy_order(ferias[n], len(strategies[n]))
+                    index = next(i for i in order if i not in tried[n])
+                    tried[n].add(index)
+                    picks[n] = (index, strategies[n][index])
+                
+                unique = list(dict.fromkeys(query for _, query in picks.values()))
+                if verbose:
+                    click.echo(f"  Step {step+1}: {len(unique)} unique queries for {len(pending)} ferias")
+                results = dict(zip(unique, map_queries(self.geocode_address, unique)))
+                
+                # Drop hits outside Montevideo in one vectorized pass over the batch
+                hits = [query for query in unique if results[query]]
+                if hits:
+                    inside = _in_montevideo(np.array([results[query] for query in hits], dtype=np.float64))
+                    for query, ok in zip(hits, inside.tolist()):
+                        if not ok:
+                            results[query] = None
+                
+                still_pending = []
+                for n in pending:
+                    index, query = picks[n]
+                    location = results[query]
+                    if location:
+                        ferias[n]['coordinates'] = location
+                        self._remember_strategy(ferias[n], index, query)
+                        progress.update(1)
+                    elif len(tried[n]) < len(strategies[n]):
+                        still_pending.append(n)
+                    else:
+                        progress.update(1)
+                pending = still_pending
+                step += 1
+    
+    def generate_map(self, ferias: List[Dict], output_file: Optional[str] = 'ferias_map.html', verbose: bool = False,
+                     workers: int = GEOCODE_WORKERS) -> Optional[str]:
         """
         Generate an interactive HTML map from feria data.
         
         Args:
             ferias: List of feria dictionaries
-            output_file: Output HTML file path
+            output_file: Output HTML file path, or None to skip writing it
             verbose: Whether to show verbose output
+            workers: Number of threads geocoding concurrently
             
         Returns:
-            True if successful, False otherwise
+            The rendered HTML, or None if generation failed
         """
         if not ferias:
             click.echo("No feria data provided.", err=True)
-            return False
+            return None
         
-        # Geocode all ferias
-        successful_geocoding = 0
-        geocoded_ferias = []
+        self.geocode_all(ferias, verbose, workers)
+        return self.render_map(ferias, output_file)
+    
+    def render_map(self, ferias: List[Dict], output_file: Optional[str] = 'ferias_map.html') -> Optional[str]:
+        """
+        Render an interactive HTML map from already geocoded feria data.
         
-        click.echo("Geocoding feria locations...")
+        Ferias without 'coordinates' are left off the map.
         
-        for feria in tqdm(ferias, desc="Processing ferias"):
-            coordinates = self.geocode_feria_location(feria, verbose)
-            
-            if coordinates:
-                feria['coordinates'] = coordinates
-                geocoded_ferias.append(feria)
-                successful_geocoding += 1
-            else:
-                feria['coordinates'] = None
-                if verbose:
-                    click.echo(f"Failed to geocode: {feria['street']} in {feria['barrio']}")
+        Args:
+            ferias: List of feria dictionaries
+            output_file: Output HTML file path, or None to skip writing it
             
-            time.sleep(1)  # Be respectful with API requests
+        Returns:
+            The rendered HTML, or None if rendering failed
+        """
+        geocoded_ferias = [feria for feria in ferias if feria.get('coordinates')]
+        successful_geocoding = len(geocoded_ferias)
         
         if not geocoded_ferias:
             click.echo("No locations could be geocoded. Cannot generate map.", err=True)
-            return False
+            return None
         
-        # Calculate map center from successful coordinates
-        if geocoded_ferias:
-            avg_lat = sum(feria['coordinates'][0] for feria in geocoded_ferias) / len(geocoded_ferias)
-            avg_lon = sum(feria['coordinates'][1] for feria in geocoded_ferias) / len(geocoded_ferias)
-            center = [avg_lat, avg_lon]
-        else:
-            center = list(self.montevideo_center)
+        for feria in geocoded_ferias:
+            if '_location_desc' not in feria:
+                self._annotate(feria)
+        
+        # Coordinates as one contiguous (N, 2) array; map center is its mean
+        coords = np.fromiter(
+            (c for feria in geocoded_ferias for c in feria['coordinates']),
+            dtype=np.float64,
+            count=2 * len(geocoded_ferias)
+        ).reshape(-1, 2)
+        lats, lons = coords[:, 0], coords[:, 1]
+        center = coords.mean(axis=0).tolist()
         
         # Create the map
         m = folium.Map(
@@ -222,210 +540,292 @@ class FeriasMapGenerator:
             tiles='OpenStreetMap'
         )
         
-        # Add markers for each successfully geocoded feria
-        for feria in geocoded_ferias:
-            lat, lon = feria['coordinates']
+        # One GeoJSON point per successfully geocoded feria, carrying its marker data
+        features = []
+        for lat, lon, feria in zip(lats.tolist(), lons.tolist(), geocoded_ferias):
             day = feria['day']
-            color = self.day_colors.get(day, 'gray')
-            
-            # Create popup content
-            is_intersection = feria['from'] == feria['to']
-            
-            if is_intersection:
-                location_desc = f"{feria['street']} y {feria['from']}"
-            else:
-                location_desc = f"{feria['street']} entre {feria['from']} y {feria['to']}"
-            
-            popup_content = f"""
-            <div style="font-family: Arial, sans-serif; min-width: 250px; max-width: 300px;">
-                <h4 style="margin: 0 0 10px 0; color: #333; border-bottom: 2px solid {color}; padding-bottom: 5px;">
-                    {feria['barrio']}
-                </h4>
-                <p style="margin: 8px 0;"><strong>Ubicación:</strong> {location_desc}</p>
-                <p style="margin: 8px 0;"><strong>Día:</strong> <span style="color: {color}; font-weight: bold;">{day}</span></p>
-            </div>
-            """
-            
-            # Add marker
-            folium.Marker(
-                location=[lat, lon],
-                popup=folium.Popup(popup_content, max_width=350),
-                icon=folium.Icon(color=color, icon='shopping-cart', prefix='fa'),
-                tooltip=f"{feria['barrio']} - {day}"
-            ).add_to(m)
+            color = self._COLORS_BY_INT[feria['_day_int']]
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': {
+                    'color': color,
+                    'popup': _POPUP_TEMPLATE.render(
+                        color=color, barrio=feria['barrio'], location_desc=feria['_location_desc'], day=day
+                    ),
+                    'tooltip': f"{feria['barrio']} - {day}"
+                }
+            })
         
-        # Add improved legend
-        legend_html = '''
-        <div style="position: fixed; 
-                    bottom: 20px; left: 20px; 
-                    background-color: white; 
-                    border: 2px solid #666; 
-                    border-radius: 8px;
-                    z-index: 9999; 
-                    font-family: Arial, sans-serif;
-                    font-size: 12px; 
-                    padding: 15px;
-                    box-shadow: 0 2px 10px rgba(0,0,0,0.3);
-                    max-height: 300px;
-                    overflow-y: auto;">
-        <h4 style="margin: 0 0 15px 0; color: #333; text-align: center; border-bottom: 1px solid #ccc; padding-bottom: 8px;">
-            Días de la Semana
-        </h4>
-        '''
+        # Add all markers as a single Leaflet layer; the icon color comes from each feature
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            name='Ferias',
+            marker=folium.Marker(icon=folium.Icon(icon='shopping-cart', prefix='fa')),
+            style_function=lambda feature: {'markerColor': feature['properties']['color']},
+            popup=folium.GeoJsonPopup(fields=['popup'], labels=False, max_width=350),
+            tooltip=folium.GeoJsonTooltip(fields=['tooltip'], labels=False)
+        ).add_to(m)
         
-        for day, color in self.day_colors.items():
-            legend_html += f'''
-            <div style="margin: 5px 0; display: flex; align-items: center;">
-                <i class="fa fa-circle" style="color: {color}; margin-right: 8px; font-size: 14px;"></i>
-                <span style="color: #333;">{day}</span>
-            </div>
-            '''
+        # Add improved legend
+        m.get_root().html.add_child(folium.Element(_LEGEND_HTML))
         
-        legend_html += '</div>'
-        m.get_root().html.add_child(folium.Element(legend_html))
+        html = m.get_root().render()
         
         # Save the map
-        try:
-            m.save(output_file)
+        if output_file:
+            try:
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(html)
+            except Exception as e:
+                click.echo(f"Error saving map to {output_file}: {e}", err=True)
+                return None
             click.echo(f"Successfully generated map with {successful_geocoding}/{len(ferias)} ferias at {output_file}")
-            if successful_geocoding < len(ferias):
-                click.echo(f"Warning: {len(ferias) - successful_geocoding} ferias could not be geocoded and were excluded from the map.")
-            return True
-        except Exception as e:
-            click.echo(f"Error saving map to {output_file}: {e}", err=True)
-            return False
+        else:
+            click.echo(f"Successfully generated map with {successful_geocoding}/{len(ferias)} ferias")
+        
+        if successful_geocoding < len(ferias):
+            click.echo(f"Warning: {len(ferias) - successful_geocoding} ferias could not be geocoded and were excluded from the map.")
+        return html
     
-    def generate_png_snapshot(self, html_file: str, output_png: str = 'ferias_map.png') -> bool:
+    def generate_png_snapshot(self, html: str, output_png: str = 'ferias_map.png',
+                              html_file: Optional[str] = None) -> bool:
         """
-        Generate a PNG snapshot of the HTML map using Node.js and Puppeteer.
+        Generate a PNG snapshot of a rendered HTML map.
+        
+        Uses Playwright in-process when it is installed, otherwise Node.js
+        and Puppeteer.
         
         Args:
-            html_file: Path to the HTML map file
+            html: Rendered HTML of the map
             output_png: Output PNG file path
+            html_file: Path the HTML was saved to, if any (used by Puppeteer)
             
         Returns:
             True if successful, False otherwise
         """
-        # Check if Node.js is available
+        if sync_playwright is not None:
+            return self._snapshot_playwright(html, output_png)
+        
+        if html_file:
+            return self._snapshot_puppeteer(html_file, output_png)
+        
+        # Puppeteer needs a file to load; write a throwaway copy
+        with tempfile.NamedTemporaryFile('w', suffix='.html', encoding='utf-8', delete=False) as tf:
+            tf.write(html)
         try:
-            subprocess.run(['node', '--version'], check=True, capture_output=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            click.echo("Node.js is not installed or not available in PATH.", err=True)
+            return self._snapshot_puppeteer(tf.name, output_png)
+        finally:
+            os.unlink(tf.name)
+    
+    def _snapshot_playwright(self, html: str, output_png: str) -> bool:
+        """Take the PNG snapshot with a headless Chromium driven by Playwright."""
+        try:
+            with sync_playwright() as p:
+                browser = p.chromium.launch()
+                try:
+                    page = browser.new_page(viewport={'width': 1200, 'height': 800})
+                    # Wait for map tiles instead of a fixed delay
+                    page.set_content(html, wait_until='networkidle')
+                    page.screenshot(path=output_png)
+                finally:
+                    browser.close()
+        except Exception as e:
+            click.echo(f"Error creating PNG snapshot: {e}", err=True)
             return False
         
-        # Create a simple Node.js script to capture the HTML
-        node_script = f'''
-const puppeteer = require('puppeteer');
-const path = require('path');
-
-(async () => {{
-    const browser = await puppeteer.launch({{headless: true}});
-    const page = await browser.newPage();
-    
-    // Load the HTML file
-    const htmlPath = path.resolve('{html_file}');
-    await page.goto(`file://${{htmlPath}}`);
+        click.echo(f"Successfully generated PNG snapshot: {output_png}")
+        return True
     
-    // Wait for map to load
-    await page.waitForTimeout(3000);
-    
-    // Set viewport size
-    await page.setViewport({{width: 1200, height: 800}});
-    
-    // Take screenshot
-    await page.screenshot({{
-        path: '{output_png}',
-        fullPage: false
-    }});
-    
-    await browser.close();
-    console.log('Screenshot saved to {output_png}');
-}})();
-'''
+    def _snapshot_puppeteer(self, html_file: str, output_png: str) -> bool:
+        """Take the PNG snapshot by running a Puppeteer script with Node.js."""
+        # Check if Node.js is available; Puppeteer is expected to be installed already
+        if shutil.which('node') is None:
+            click.echo("Node.js is not installed or not available in PATH.", err=True)
+            return False
         
-        # Write the Node.js script to a temporary file
-        script_file = 'temp_screenshot.js'
         try:
-            with open(script_file, 'w') as f:
-                f.write(node_script)
-            
-            # Check if Puppeteer is installed
-            try:
-                subprocess.run(['npm', 'list', 'puppeteer'], check=True, capture_output=True)
-            except subprocess.CalledProcessError:
-                click.echo("Installing Puppeteer...")
-                subprocess.run(['npm', 'install', 'puppeteer'], check=True)
-            
-            # Run the screenshot script
-            result = subprocess.run(['node', script_file], capture_output=True, text=True)
+            # Run the screenshot script, passing paths as JSON so they are never parsed as JS
+            result = subprocess.run(
+                ['node', SNAPSHOT_SCRIPT],
+                input=json.dumps({'html': html_file, 'png': output_png}),
+                capture_output=True,
+                text=True
+            )
             
             if result.returncode == 0:
                 click.echo(f"Successfully generated PNG snapshot: {output_png}")
                 return True
             else:
                 click.echo(f"Error generating PNG: {result.stderr}", err=True)
+                if "Cannot find module 'puppeteer'" in result.stderr:
+                    click.echo("Install Puppeteer with 'npm install puppeteer' (or install Playwright).", err=True)
                 return False
                 
         except Exception as e:
             click.echo(f"Error creating PNG snapshot: {e}", err=True)
             return False
-        finally:
-            # Clean up temporary script file
-            if os.path.exists(script_file):
-                os.remove(script_file)
 
 
-@click.command()
+def load_ferias(path: str) -> List[Dict]:
+    """Load a feria JSON file, exiting with an error message on failure."""
+    # Check if input file exists
+    if not os.path.exists(path):
+        click.echo(f"Input file not found: {path}", err=True)
+        sys.exit(1)
+    
+    try:
+        if orjson is not None:
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    except json.JSONDecodeError as e:
+        click.echo(f"Error parsing JSON file {path}: {e}", err=True)
+        sys.exit(1)
+    except Exception as e:
+        click.echo(f"Error reading file {path}: {e}", err=True)
+        sys.exit(1)
+
+
+def save_geocoded_ferias(ferias: List[Dict], path: str) -> None:
+    """Write ferias with their coordinates to JSON, exiting with an error message on failure."""
+    # Derived fields are rebuilt on load, keep the file in the scraper's format
+    records = [{key: value for key, value in feria.items() if not key.startswith('_')} for feria in ferias]
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        click.echo(f"Error saving to {path}: {e}", err=True)
+        sys.exit(1)
+
+
+def write_outputs(generator: FeriasMapGenerator, html: Optional[str], html_file: Optional[str],
+                  snapshot: bool, png_output: str, verbose: bool) -> None:
+    """Exit on a failed map, then take the PNG snapshot if requested."""
+    if html is None:
+        sys.exit(1)
+    
+    # Generate PNG snapshot if requested
+    if snapshot:
+        if verbose:
+            click.echo("Generating PNG snapshot...")
+        
+        if not generator.generate_png_snapshot(html, png_output, html_file):
+            if html_file:
+                click.echo("Warning: PNG snapshot generation failed, but HTML map was created successfully.", err=True)
+            else:
+                sys.exit(1)
+
+
+@click.group(invoke_without_command=True)
 @click.option('--input', '-i', default='ferias.json', help='Input JSON file path')
 @click.option('--output', '-o', default='ferias_map.html', help='Output HTML file path')
+@click.option('--no-html', is_flag=True, help='Do not write the HTML file (useful with --snapshot)')
 @click.option('--snapshot', '-s', is_flag=True, help='Generate PNG snapshot of the map')
 @click.option('--png-output', default='ferias_map.png', help='Output PNG file path (when using --snapshot)')
+@click.option('--cache-file', default=GEOCODE_CACHE_FILE, help='Geocoding cache file path')
+@click.option('--workers', '-w', default=GEOCODE_WORKERS, type=int, help='Number of concurrent geocoding threads')
 @click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
-def main(input, output, snapshot, png_output, verbose):
+@click.pass_context
+def main(ctx, input, output, no_html, snapshot, png_output, cache_file, workers, verbose):
     """
     Generate an interactive map from feria data JSON file.
     
+    Without a command, geocodes and renders in one run. Use the geocode and
+    render commands to geocode once and re-render without geocoding again.
+    
     Example usage:
         python generate_ferias_map.py -i ferias.json -o my_map.html
         
         python generate_ferias_map.py -i ferias.json --snapshot
+        
+        python generate_ferias_map.py -i ferias.json --snapshot --no-html
+        
+        python generate_ferias_map.py geocode -i ferias.json -o ferias.geocoded.json
+        
+        python generate_ferias_map.py render -i ferias.geocoded.json --snapshot
     """
+    if ctx.invoked_subcommand is not None:
+        # These options belong to the one-step run; commands take their own
+        misplaced = [name for name in ctx.params
+                   if ctx.get_parameter_source(name) is not click.core.ParameterSource.DEFAULT]
+        if misplaced:
+            raise click.UsageError(
+                f"Options before '{ctx.invoked_subcommand}' are not used by it; "
+                "pass them after the command name.")
+        return
     
-    # Check if input file exists
-    if not os.path.exists(input):
-        click.echo(f"Input file not found: {input}", err=True)
+    if no_html and not snapshot:
+        click.echo("Nothing to do: --no-html without --snapshot.", err=True)
         sys.exit(1)
+    html_file = None if no_html else output
     
     # Load feria data
-    try:
-        with open(input, 'r', encoding='utf-8') as f:
-            ferias = json.load(f)
-        
-        if verbose:
-            click.echo(f"Loaded {len(ferias)} ferias from {input}")
-    
-    except json.JSONDecodeError as e:
-        click.echo(f"Error parsing JSON file {input}: {e}", err=True)
-        sys.exit(1)
-    except Exception as e:
-        click.echo(f"Error reading file {input}: {e}", err=True)
-        sys.exit(1)
+    ferias = load_ferias(input)
+    if verbose:
+        click.echo(f"Loaded {len(ferias)} ferias from {input}")
     
     # Initialize map generator
-    generator = FeriasMapGenerator()
+    generator = FeriasMapGenerator(cache_file)
     
     # Generate the HTML map
-    if not generator.generate_map(ferias, output, verbose):
+    html = generator.generate_map(ferias, html_file, verbose, workers)
+    write_outputs(generator, html, html_file, snapshot, png_output, verbose)
+
+
+@main.command()
+@click.option('--input', '-i', default='ferias.json', help='Input JSON file path')
+@click.option('--output', '-o', default='ferias.geocoded.json', help='Output geocoded JSON file path')
+@click.option('--cache-file', default=GEOCODE_CACHE_FILE, help='Geocoding cache file path')
+@click.option('--workers', '-w', default=GEOCODE_WORKERS, type=int, help='Number of concurrent geocoding threads')
+@click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
+def geocode(input, output, cache_file, workers, verbose):
+    """
+    Geocode feria data and save it with coordinates, ready for render.
+    
+    Example usage:
+        python generate_ferias_map.py geocode -i ferias.json -o ferias.geocoded.json
+    """
+    ferias = load_ferias(input)
+    if verbose:
+        click.echo(f"Loaded {len(ferias)} ferias from {input}")
+    
+    generator = FeriasMapGenerator(cache_file)
+    geocoded_ferias = generator.geocode_all(ferias, verbose, workers)
+    save_geocoded_ferias(ferias, output)
+    
+    click.echo(f"Successfully geocoded {len(geocoded_ferias)}/{len(ferias)} ferias to {output}")
+
+
+@main.command()
+@click.option('--input', '-i', default='ferias.geocoded.json', help='Geocoded JSON file path (from the geocode command)')
+@click.option('--output', '-o', default='ferias_map.html', help='Output HTML file path')
+@click.option('--no-html', is_flag=True, help='Do not write the HTML file (useful with --snapshot)')
+@click.option('--snapshot', '-s', is_flag=True, help='Generate PNG snapshot of the map')
+@click.option('--png-output', default='ferias_map.png', help='Output PNG file path (when using --snapshot)')
+@click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
+def render(input, output, no_html, snapshot, png_output, verbose):
+    """
+    Render a map from feria data saved by geocode, without geocoding again.
+    
+    Example usage:
+        python generate_ferias_map.py render -i ferias.geocoded.json -o my_map.html --snapshot
+    """
+    if no_html and not snapshot:
+        click.echo("Nothing to do: --no-html without --snapshot.", err=True)
         sys.exit(1)
+    html_file = None if no_html else output
     
-    # Generate PNG snapshot if requested
-    if snapshot:
-        if verbose:
-            click.echo("Generating PNG snapshot...")
-        
-        if not generator.generate_png_snapshot(output, png_output):
-            click.echo("Warning: PNG snapshot generation failed, but HTML map was created successfully.", err=True)
+    ferias = load_ferias(input)
+    if verbose:
+        click.echo(f"Loaded {len(ferias)} ferias from {input}")
+    
+    generator = FeriasMapGenerator(cache_file=None)
+    html = generator.render_map(ferias, html_file)
+    write_outputs(generator, html, html_file, snapshot, png_output, verbose)
 
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
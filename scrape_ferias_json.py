@@ -6,27 +6,329 @@ Scrapes data from municipal websites to extract information about neighborhood m
 Outputs structured JSON data with location and schedule information.
 """
 
+import itertools
 import json
 import re
 import sys
-from typing import List, Dict, Optional
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 import click
+import lxml.html
 import requests
-from bs4 import BeautifulSoup
+from lxml import etree
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
 import time
 
+try:
+    import orjson
+except ImportError:  # Optional; faster JSON writing
+    orjson = None
+
+
+# Default number of pages fetched concurrently
+SCRAPE_WORKERS = 8
+
+# Minimum seconds between requests to the same host
+MIN_HOST_INTERVAL = 1.0
+
+# Feria line patterns, in order of preference. Each entry is (pattern, same_end):
+# "range" patterns capture street, from, to and day; "same_end" ones
+# ("Street y Start. Day") capture street, from and day, with to equal to from.
+_FERIA_PATTERN_SOURCES = [
+    # Pattern 1: "Street entre Start y End. Day"
+    (r'([A-Za-záéíóúñ\s\.]+)\s+entre\s+([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*', False),
+    # Pattern 2: "Street entre Start y End. Day" (without bold)
+    (r'([A-Za-záéíóúñ\s\.]+)\s+entre\s+([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)', False),
+    # Pattern 3: "Street, desde Start hasta End. Day"
+    (r'([A-Za-záéíóúñ\s\.]+),\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*', False),
+    # Pattern 4: "Street, desde Start hasta End. Day" (without bold)
+    (r'([A-Za-záéíóúñ\s\.]+),\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)', False),
+    # Pattern 5: "Street y Start. Day" (simpler format)
+    (r'([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*', True),
+    # Pattern 6: "Street y Start. Day" (without bold)
+    (r'([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)', True),
+    # Pattern 7: "Street desde Start hasta End. Day" (without comma)
+    (r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*', False),
+    # Pattern 8: "Street desde Start hasta End. Day" (without bold and comma)
+    (r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)', False),
+    # Pattern 9: More comprehensive pattern for complex cases with numbers and special chars
+    # (also covers "AV." abbreviations)
+    (r'([A-Za-záéíóúñ\s\.]+)\s+entre\s+([A-Za-záéíóúñ\s\.0-9]+)\s+y\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)', False),
+    # Pattern 10: More comprehensive pattern for "y" cases with numbers and special chars
+    (r'([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)', True),
+    # Pattern 11: More comprehensive pattern for "desde/hasta" cases with numbers and special chars
+    (r'([A-Za-záéíóúñ\s\.]+),\s+desde\s+([A-Za-záéíóúñ\s\.0-9]+)\s+hasta\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)', False),
+    # Pattern 12: More comprehensive pattern for "desde/hasta" without comma, with numbers and special chars
+    (r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.0-9]+)\s+hasta\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)', False),
+    # Pattern 13: Handle cases with "Nº" and other special characters
+    (r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.0-9º]+)\s+hasta\s+([A-Za-záéíóúñ\s\.0-9º]+)\.\s*([A-Za-záéíóúñ]+)', False),
+]
+
+
+def _combine_patterns(patterns):
+    """
+    Join feria line patterns into one alternation scanned in a single pass.
+    
+    Returns:
+        The compiled pattern and a dict mapping the number of each
+        alternative's last (day) group to its (street, from, to, day) group numbers
+    """
+    alternatives = []
+    groups = {}
+    first = 1
+    for pattern, same_end in patterns:
+        alternatives.append(f'(?:{pattern})')
+        numbers = range(first, first + re.compile(pattern).groups)
+        street, from_group, day = numbers[0], numbers[1], numbers[-1]
+        groups[day] = (street, from_group, from_group if same_end else numbers[2], day)
+        first = numbers[-1] + 1
+    return re.compile('|'.join(alternatives)), groups
+
+
+# Connector words that only some patterns require. A line missing one of them
+# can skip every alternative that spells it out.
+_CONNECTORS = ('entre', 'desde', 'hasta')
+
+
+def _connectors_in(text: str) -> frozenset:
+    """Return the connector words that appear anywhere in text."""
+    return frozenset(word for word in _CONNECTORS if word in text)
+
+
+# Combined pattern for each set of connectors present in a line, holding only
+# the alternatives that line could match. Dropping alternatives that cannot
+# match leaves the result of the search unchanged.
+_FERIA_MATCHERS = {
+    frozenset(present): _combine_patterns([
+        (pattern, same_end) for pattern, same_end in _FERIA_PATTERN_SOURCES
+        if _connectors_in(pattern) <= set(present)
+    ])
+    for size in range(len(_CONNECTORS) + 1)
+    for present in itertools.combinations(_CONNECTORS, size)
+}
+
+# The street groups above are ambiguous runs of letters, dots and spaces, so a
+# line that repeats "entre"/"y"/"desde" but does not match backtracks through
+# every way of splitting it, which grows with the cube of its length. Every
+# alternative ends in ". Day" (optionally bold), so the patterns only scan the
+# text up to a tail naming a day, trying each such tail in turn; a remark after
+# the day cannot change the match. Entries far longer than any real one (a
+# street and two cross streets, well under 100 characters) are skipped instead
+# of scanned.
+_FERIA_TAIL_RE = re.compile(r'\.\s*(?:\*\*)?([A-Za-záéíóúñ]+)(?:\*\*)?')
+_MAX_FERIA_ENTRY_LENGTH = 500
+
+
+def _day_entries(text: str) -> Iterator[str]:
+    """
+    Yield text cut after each of its ". Day" tails, shortest first.
+    
+    Args:
+        text: Stripped feria line
+        
+    Yields:
+        The line without whatever follows that day
+    """
+    for tail in _FERIA_TAIL_RE.finditer(text):
+        if tail.group(1).lower() in _VALID_DAYS:
+            yield text[:tail.end()]
+
+
+# Characters of a "plain" feria line besides whitespace: letters and dots only
+_PLAIN_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzáéíóúñ.')
+
+
+def _split_plain_feria(text: str) -> Optional[Tuple[str, str, str, str]]:
+    """
+    Split a plain feria line into (street, from, to, day) without the regex.
+    
+    Handles "Street entre Start y End. Day", "Street y Start. Day" and
+    "Street desde Start hasta End. Day" when each connector word occurs once,
+    which is when the greedy patterns have only one way to match and this
+    gives the same result as _FERIA_MATCHERS once whitespace is collapsed.
+    
+    Args:
+        text: Stripped feria line
+        
+    Returns:
+        Tuple of street, from, to and day, or None if the line needs the regex
+    """
+    words = text.split()
+    if len(words) < 4 or not _PLAIN_CHARS.issuperset(''.join(words)):
+        return None
+    # The day may be followed by dots, which the patterns ignore
+    day = words[-1].rstrip('.')
+    body = words[:-1]
+    if not day or '.' in day or not body[-1].endswith('.'):
+        return None
+    
+    if 'entre' in body:
+        start = body.index('entre')
+        if body.count('entre') != 1 or body[start:].count('y') != 1:
+            return None
+        end = body.index('y', start)
+        street, from_words, to_words = body[:start], body[start + 1:end], body[end + 1:]
+    elif 'y' in body:
+        if body.count('y') != 1:
+            return None
+        start = body.index('y')
+        street, from_words = body[:start], body[start + 1:]
+        to_words = from_words
+    elif 'desde' in body and 'hasta' in body:
+        start, end = body.index('desde'), body.index('hasta')
+        if body.count('desde') != 1 or body.count('hasta') != 1 or end < start:
+            return None
+        street, from_words, to_words = body[:start], body[start + 1:end], body[end + 1:]
+    else:
+        return None
+    
+    # The last word before the day carries the "." that ends the line
+    from_street = ' '.join(from_words)
+    to_street = ' '.join(to_words)[:-1]
+    if to_words is from_words:
+        from_street = to_street
+    if not street or not from_street or not to_street:
+        return None
+    return ' '.join(street), from_street, to_street, day
+
+
+def _match_feria(entry: str) -> Optional[Tuple[str, str, str, str]]:
+    """
+    Split a feria entry ending in its day into (street, from, to, day).
+    
+    Args:
+        entry: Feria line cut after its day
+        
+    Returns:
+        Tuple of street, from, to and day, or None if no pattern matches
+    """
+    parts = _split_plain_feria(entry)
+    if parts is None:
+        feria_re, feria_groups = _FERIA_MATCHERS[_connectors_in(entry)]
+        match = feria_re.search(entry)
+        if not match:
+            return None
+        
+        # The day is the last group of whichever alternative matched
+        parts = tuple(match.group(number).strip() for number in feria_groups[match.lastindex])
+    return parts
+
+
+# Article body holding the feria lists, matched as one of the div's classes
+_CONTENT_XPATH = etree.XPath(
+    '//div[contains(concat(" ", normalize-space(@class), " "), " field--name-field-art-cuerpo-contenido ")]'
+)
+
+# Barrio headers and feria list items, selected in one descendant step so they
+# come back in document order without sorting a union. Items in nested lists
+# are selected on their own, so each item is read without its nested lists.
+_FERIA_NODES_XPATH = etree.XPath(
+    'descendant::*[self::h2 or self::h3 or (self::li and ancestor::ul)]'
+)
+
+# Fallback match for pages without that body
+_FERIA_WORD_RE = re.compile(r'feria', re.IGNORECASE)
+
+
+def _html_encoding(response: requests.Response) -> Optional[str]:
+    """
+    Pick the charset lxml should decode a page with.
+    
+    Args:
+        response: Response holding the page
+        
+    Returns:
+        The charset from the Content-Type header; None to let lxml read the
+        page's <meta> tag; or UTF-8 when the first 1024 bytes, where browsers
+        look for that tag, declare no charset either
+    """
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return response.encoding
+    if b'charset' in response.content[:1024].lower():
+        return None
+    return 'utf-8'
+
+
+def _own_text(element: lxml.html.HtmlElement) -> str:
+    """
+    Return the text inside an element, leaving out nested <ul> lists.
+    
+    Elements without nested lists are serialized by libxml2 in one call, which
+    gives the same text as text_content() several times faster.
+    
+    Args:
+        element: Element to read
+        
+    Returns:
+        The element's text
+    """
+    if element.find('.//ul') is None:
+        return etree.tostring(element, method='text', encoding=str, with_tail=False)
+    
+    parts = [element.text or '']
+    for child in element:
+        # Skip nested lists, plus comments and processing instructions
+        if isinstance(child.tag, str) and child.tag != 'ul':
+            parts.append(_own_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def _stripped_text(element: lxml.html.HtmlElement) -> str:
+    """Return an element's own text (see _own_text) with surrounding whitespace removed."""
+    return _own_text(element).strip()
+
+
+def _single_string(element: lxml.html.HtmlElement) -> Optional[str]:
+    """
+    Return the text of an element whose only content is one string.
+    
+    Follows elements that wrap a single child, like BeautifulSoup's Tag.string.
+    
+    Args:
+        element: Element to inspect
+        
+    Returns:
+        The string, or None if the element has no content or more than one piece
+    """
+    while len(element) == 1 and not element.text and not element[0].tail:
+        element = element[0]
+    if len(element) == 0:
+        return element.text
+    return None
+
+# Day names accepted in parsed feria data
+_VALID_DAYS = frozenset(['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo'])
+
+# Day names that mark a list item as a feria entry
+_DAY_RE = re.compile(r'lunes|martes|miércoles|jueves|viernes|sábado|domingo', re.IGNORECASE)
+
 
 class FeriasScraper:
     """Scraper for extracting feria vecinal data from municipal websites."""
     
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, verbose: bool = False):
         self.base_url = base_url
+        self.verbose = verbose
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # Ask for every compression urllib3 can decode (brotli when installed)
+        self.session.headers.update(make_headers(accept_encoding=True))
+        # Retry transient server errors with backoff instead of losing the page
+        adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._host_locks = {}
+        self._host_locks_lock = threading.Lock()
+        self._last_request = {}
     
     def extract_ferias_from_page(self, url: str) -> List[Dict]:
         """
@@ -39,43 +341,48 @@ class FeriasScraper:
             List of dictionaries containing feria data
         """
         try:
+            # Be respectful with requests
+            self._wait_for_host(url)
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
             ferias = []
             
+            # Let lxml decode the raw bytes itself
+            parser = lxml.html.HTMLParser(encoding=_html_encoding(response))
+            root = lxml.html.document_fromstring(response.content, parser=parser)
+            
             # Find the main content area that contains the feria information
             # Look for the div with class that contains the feria content
-            content_div = soup.find('div', class_='field--name-field-art-cuerpo-contenido')
-            if not content_div:
+            content_div = next(iter(_CONTENT_XPATH(root)), None)
+            if content_div is None:
                 # Fallback: look for any div containing feria information
-                content_div = soup.find('div', string=re.compile(r'feria', re.IGNORECASE))
+                content_div = next((div for div in root.iter('div')
+                                    if _FERIA_WORD_RE.search(_single_string(div) or '')), None)
             
-            if not content_div:
+            if content_div is None:
                 click.echo(f"No feria content found on {url}", err=True)
                 return []
             
             # Extract ferias from the structured HTML
             current_barrio = "Desconocido"
             
-            # Process each element in the content
-            for element in content_div.find_all(['h2', 'h3', 'ul', 'li']):
-                if element.name in ['h2', 'h3']:
+            # Walk headers and list items once, in document order
+            for element in _FERIA_NODES_XPATH(content_div):
+                if element.tag in ['h2', 'h3']:
                     # This is a barrio header
-                    barrio_text = element.get_text().strip()
+                    barrio_text = _stripped_text(element)
                     if barrio_text and len(barrio_text) > 2 and not barrio_text.startswith('CCZ'):
                         current_barrio = barrio_text
                 
-                elif element.name == 'ul':
-                    # This is a list of ferias for the current barrio
-                    for li in element.find_all('li'):
-                        li_text = li.get_text().strip()
-                        if li_text and any(day in li_text.lower() for day in ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']):
-                            # Extract feria information from this list item
-                            feria_data = self._parse_feria_text(li_text, current_barrio)
-                            if feria_data:
-                                ferias.append(feria_data)
+                else:
+                    # This is a feria of the current barrio
+                    li_text = _stripped_text(element)
+                    if li_text and _DAY_RE.search(li_text):
+                        # Extract feria information from this list item
+                        feria_data = self._parse_feria_text(li_text, current_barrio)
+                        if feria_data:
+                            ferias.append(feria_data)
             
             return ferias
             
@@ -99,146 +406,18 @@ class FeriasScraper:
         """
         # Clean the text
         text = text.strip()
-        
-        # Pattern 1: "Street entre Start y End. Day"
-        pattern1 = r'([A-Za-záéíóúñ\s\.]+)\s+entre\s+([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*'
-        match = re.search(pattern1, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 2: "Street entre Start y End. Day" (without bold)
-        pattern2 = r'([A-Za-záéíóúñ\s\.]+)\s+entre\s+([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern2, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 3: "Street, desde Start hasta End. Day"
-        pattern3 = r'([A-Za-záéíóúñ\s\.]+),\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*'
-        match = re.search(pattern3, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 4: "Street, desde Start hasta End. Day" (without bold)
-        pattern4 = r'([A-Za-záéíóúñ\s\.]+),\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern4, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 5: "Street y Start. Day" (simpler format)
-        pattern5 = r'([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*'
-        match = re.search(pattern5, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(2).strip()  # Same as from for simple format
-            day = match.group(3).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 6: "Street y Start. Day" (without bold)
-        pattern6 = r'([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern6, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(2).strip()  # Same as from for simple format
-            day = match.group(3).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 7: "Street desde Start hasta End. Day" (without comma)
-        pattern7 = r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*\*\*([A-Za-záéíóúñ]+)\*\*'
-        match = re.search(pattern7, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 8: "Street desde Start hasta End. Day" (without bold and comma)
-        pattern8 = r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.]+)\s+hasta\s+([A-Za-záéíóúñ\s\.]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern8, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 9: More comprehensive pattern for complex cases with numbers and special chars
-        pattern9 = r'([A-Za-záéíóúñ\s\.]+)\s+entre\s+([A-Za-záéíóúñ\s\.0-9]+)\s+y\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern9, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 10: More comprehensive pattern for "y" cases with numbers and special chars
-        pattern10 = r'([A-Za-záéíóúñ\s\.]+)\s+y\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern10, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(2).strip()  # Same as from for simple format
-            day = match.group(3).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 11: More comprehensive pattern for "desde/hasta" cases with numbers and special chars
-        pattern11 = r'([A-Za-záéíóúñ\s\.]+),\s+desde\s+([A-Za-záéíóúñ\s\.0-9]+)\s+hasta\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern11, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 12: More comprehensive pattern for "desde/hasta" without comma, with numbers and special chars
-        pattern12 = r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.0-9]+)\s+hasta\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern12, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 13: Handle cases with "AV." abbreviation
-        pattern13 = r'([A-Za-záéíóúñ\s\.]+)\s+entre\s+([A-Za-záéíóúñ\s\.0-9]+)\s+y\s+([A-Za-záéíóúñ\s\.0-9]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern13, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
-        
-        # Pattern 14: Handle cases with "Nº" and other special characters
-        pattern14 = r'([A-Za-záéíóúñ\s\.]+)\s+desde\s+([A-Za-záéíóúñ\s\.0-9º]+)\s+hasta\s+([A-Za-záéíóúñ\s\.0-9º]+)\.\s*([A-Za-záéíóúñ]+)'
-        match = re.search(pattern14, text)
-        if match:
-            street = match.group(1).strip()
-            from_street = match.group(2).strip()
-            to_street = match.group(3).strip()
-            day = match.group(4).strip()
-            return self._create_feria_data(barrio, street, from_street, to_street, day, text)
+        for entry in _day_entries(text):
+            if len(entry) > _MAX_FERIA_ENTRY_LENGTH:
+                if self.verbose:
+                    click.echo(f"Skipping overlong feria line ({len(text)} characters): {text[:60]}...", err=True)
+                return None
+            
+            parts = _match_feria(entry)
+            if parts is not None:
+                street, from_street, to_street, day = parts
+                feria_data = self._create_feria_data(barrio, street, from_street, to_street, day, text)
+                if feria_data:
+                    return feria_data
         
         return None
     
@@ -257,20 +436,20 @@ class FeriasScraper:
         Returns:
             Dictionary with feria data or None if validation fails
         """
-        # Clean up the data
-        barrio = re.sub(r'\s+', ' ', barrio).strip()
-        street = re.sub(r'\s+', ' ', street).strip()
-        from_street = re.sub(r'\s+', ' ', from_street).strip()
-        to_street = re.sub(r'\s+', ' ', to_street).strip()
-        day = re.sub(r'\s+', ' ', day).strip()
+        # Clean up the data, collapsing whitespace runs to single spaces
+        barrio = ' '.join(barrio.split())
+        street = ' '.join(street.split())
+        from_street = ' '.join(from_street.split())
+        to_street = ' '.join(to_street.split())
+        day = ' '.join(day.split())
         
         # Remove bold markers from day
-        day = re.sub(r'\*\*', '', day)
+        day = day.replace('**', '')
         
         # Validate that we have meaningful data
         if (len(street) > 2 and 
             len(from_street) > 2 and len(to_street) > 2 and 
-            len(day) > 2 and day.lower() in ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']):
+            len(day) > 2 and day.lower() in _VALID_DAYS):
             
             return {
                 "barrio": barrio,
@@ -283,24 +462,46 @@ class FeriasScraper:
         
         return None
     
-    def scrape_multiple_urls(self, urls: List[str]) -> List[Dict]:
+    def _wait_for_host(self, url: str) -> None:
+        """Wait until MIN_HOST_INTERVAL has passed since the last request to url's host."""
+        host = urlparse(url).netloc
+        with self._host_locks_lock:
+            if host not in self._host_locks:
+                self._host_locks[host] = threading.Lock()
+            lock = self._host_locks[host]
+        
+        with lock:
+            delay = self._last_request.get(host, float('-inf')) + MIN_HOST_INTERVAL - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_request[host] = time.monotonic()
+    
+    def scrape_multiple_urls(self, urls: List[str], workers: int = SCRAPE_WORKERS) -> List[Dict]:
         """
         Scrape feria data from multiple URLs.
         
+        Pages are fetched concurrently over the shared keep-alive session, with
+        requests to the same host at least MIN_HOST_INTERVAL seconds apart.
+        
         Args:
             urls: List of URLs to scrape
+            workers: Number of pages fetched concurrently
             
         Returns:
-            List of all feria data found across all URLs
+            List of all feria data found across all URLs, in URL order, with
+            ferias listed on more than one page kept once
         """
         all_ferias = []
+        seen = set()
         
-        for url in tqdm(urls, desc="Scraping municipal pages"):
-            ferias = self.extract_ferias_from_page(url)
-            all_ferias.extend(ferias)
-            
-            # Be respectful with requests
-            time.sleep(1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for ferias in tqdm(executor.map(self.extract_ferias_from_page, urls), total=len(urls),
+                               desc="Scraping municipal pages"):
+                for feria in ferias:
+                    key = (feria['barrio'], feria['street'], feria['from'], feria['to'], feria['day'])
+                    if key not in seen:
+                        seen.add(key)
+                        all_ferias.append(feria)
         
         return all_ferias
 
@@ -309,7 +510,7 @@ def validate_url(url: str) -> bool:
     """Validate if a URL is properly formatted."""
     try:
         result = urlparse(url)
-        return all([result.scheme, result.netloc])
+        return bool(result.scheme and result.netloc)
     except:
         return False
 
@@ -318,8 +519,9 @@ def validate_url(url: str) -> bool:
 @click.option('--urls', '-u', multiple=True, help='URLs to scrape (can specify multiple)')
 @click.option('--url-file', '-f', type=click.Path(exists=True), help='File containing URLs (one per line)')
 @click.option('--output', '-o', default='ferias.json', help='Output JSON file path')
+@click.option('--workers', '-w', default=SCRAPE_WORKERS, type=int, help='Number of pages fetched concurrently')
 @click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
-def main(urls, url_file, output, verbose):
+def main(urls, url_file, output, workers, verbose):
     """
     Scrape feria vecinal data from municipal websites.
     
@@ -335,8 +537,8 @@ def main(urls, url_file, output, verbose):
     if url_file:
         try:
             with open(url_file, 'r') as f:
-                file_urls = [line.strip() for line in f if line.strip()]
-                all_urls.extend(file_urls)
+                # URLs hold no whitespace, so splitting also drops blank lines
+                all_urls.extend(f.read().split())
         except Exception as e:
             click.echo(f"Error reading URL file: {e}", err=True)
             sys.exit(1)
@@ -345,9 +547,10 @@ def main(urls, url_file, output, verbose):
         click.echo("No URLs provided. Use --urls or --url-file options.", err=True)
         sys.exit(1)
     
-    # Validate URLs
-    valid_urls = [url for url in all_urls if validate_url(url)]
-    invalid_urls = [url for url in all_urls if not validate_url(url)]
+    # Validate URLs, parsing each one once
+    valid_urls, invalid_urls = [], []
+    for url in all_urls:
+        (valid_urls if validate_url(url) else invalid_urls).append(url)
     
     if invalid_urls:
         click.echo(f"Warning: Invalid URLs found: {invalid_urls}", err=True)
@@ -362,25 +565,26 @@ def main(urls, url_file, output, verbose):
             click.echo(f"  - {url}")
     
     # Initialize scraper and scrape data
-    scraper = FeriasScraper("")
-    ferias = scraper.scrape_multiple_urls(valid_urls)
+    scraper = FeriasScraper("", verbose)
+    ferias = scraper.scrape_multiple_urls(valid_urls, workers)
     
     if verbose:
         click.echo(f"Found {len(ferias)} ferias across all pages.")
     
     # Save results to JSON file
     try:
-        with open(output, 'w', encoding='utf-8') as f:
-            json.dump(ferias, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(output, 'wb') as f:
+                f.write(orjson.dumps(ferias, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(ferias, f, ensure_ascii=False, indent=2)
         
         click.echo(f"Successfully saved {len(ferias)} ferias to {output}")
         
         # Show summary
         if ferias:
-            days_count = {}
-            for feria in ferias:
-                day = feria['day']
-                days_count[day] = days_count.get(day, 0) + 1
+            days_count = Counter(feria['day'] for feria in ferias)
             
             click.echo("\nSummary by day:")
             for day, count in sorted(days_count.items()):
@@ -0,0 +1,42 @@
+// PNG snapshot of a ferias map, used by generate_ferias_map.py.
+//
+// Reads {"html": <path to HTML file>, "png": <output PNG path>} as JSON from stdin.
+
+// Resolve Puppeteer from the working directory first, then next to this script
+const puppeteer = require(require.resolve('puppeteer', {paths: [process.cwd(), __dirname]}));
+const {pathToFileURL} = require('url');
+
+function readStdin() {
+    return new Promise((resolve, reject) => {
+        let data = '';
+        process.stdin.setEncoding('utf8');
+        process.stdin.on('data', chunk => data += chunk);
+        process.stdin.on('end', () => resolve(data));
+        process.stdin.on('error', reject);
+    });
+}
+
+(async () => {
+    const {html, png} = JSON.parse(await readStdin());
+
+    const browser = await puppeteer.launch({headless: true});
+    const page = await browser.newPage();
+
+    // Set viewport size
+    await page.setViewport({width: 1200, height: 800});
+
+    // Load the HTML file and wait for map tiles to finish loading
+    await page.goto(pathToFileURL(html).href, {waitUntil: 'networkidle0'});
+
+    // Take screenshot
+    await page.screenshot({
+        path: png,
+        fullPage: false
+    });
+
+    await browser.close();
+    console.log(`Screenshot saved to ${png}`);
+})().catch(err => {
+    console.error(err);
+    process.exit(1);
+});
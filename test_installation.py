@@ -24,9 +24,11 @@ def main():
     print("Python Dependencies:")
     dependencies = [
         ('requests', 'requests'),
-        ('bs4', 'beautifulsoup4'),
+        ('brotli', 'brotli'),
         ('lxml', 'lxml'),
         ('folium', 'folium'),
+        ('jinja2', 'Jinja2'),
+        ('numpy', 'numpy'),
         ('geopy', 'geopy'),
         ('click', 'click'),
         ('tqdm', 'tqdm')
@@ -39,6 +41,12 @@ def main():
     
     print()
     
+    # Test optional Playwright availability
+    print("Snapshot Dependencies:")
+    playwright_ok = test_import('playwright', 'playwright (optional)')
+    
+    print()
+    
     # Test Node.js availability
     print("Node.js Dependencies:")
     try:
@@ -92,10 +100,12 @@ def main():
     else:
         print("❌ Python dependencies: Some missing - run 'pip install -r requirements.txt'")
     
-    if node_ok and npm_ok:
+    if playwright_ok:
+        print("✅ Playwright: Available for PNG snapshots")
+    elif node_ok and npm_ok:
         print("✅ Node.js dependencies: Available for PNG snapshots")
     else:
-        print("⚠️  Node.js dependencies: Not available (PNG snapshots will not work)")
+        print("⚠️  Playwright / Node.js dependencies: Not available (PNG snapshots will not work)")
     
     if all_scripts_ok:
         print("✅ Script files: All present")